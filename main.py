@@ -1,21 +1,34 @@
 import os
+import atexit
 import csv
+import re
 import sys
 import json  # For JSON handling
+import math
+import operator
+import random
+import fitz  # PyMuPDF
 import base64
-import openai
-import PyPDF2
+import shelve
+import hashlib
+import itertools
 import logging
+import logging.handlers
+import tempfile
 import asyncio
 import aiohttp
-import requests
 import traceback
 import urllib.parse
-from io import BytesIO
-from openai import OpenAI
-from bs4 import BeautifulSoup
+from html import unescape
+from datetime import datetime
+from dataclasses import dataclass
+from functools import lru_cache
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
-from typing import List, Optional
+from selectolax.parser import HTMLParser
+from typing import Dict, List, Optional, Union
 from pydantic import BaseModel, Field
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -23,6 +36,25 @@ from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+# orjson is an optional, faster JSON decoder for the large Zyte responses
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# ijson is optional, it streams the legacy scraped URL file instead of loading it whole
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# tiktoken is optional, without it the text sent to OpenAI is only bounded in characters
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 # ---------------------- Setup Logging ----------------------
 
 def setup_logging():
@@ -35,38 +67,46 @@ def setup_logging():
     os.makedirs(log_dir, exist_ok=True)
     log_file_path = os.path.join(log_dir, 'scraper.log')
 
-    # File handler (logs to file)
-    file_handler = logging.FileHandler(log_file_path)
+    # File handler (logs to file), rotated so a long run cannot fill the disk
+    file_handler = logging.handlers.RotatingFileHandler(log_file_path, maxBytes=10 << 20,
+                                                        backupCount=5, delay=True)
     file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(file_formatter)
 
+    # Records are written to the file in batches of 100, errors are written at once
+    buffered_handler = logging.handlers.MemoryHandler(100, flushLevel=logging.ERROR,
+                                                      target=file_handler)
+
     # Console handler (logs to screen)
     console_handler = logging.StreamHandler(sys.stdout)
     console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     console_handler.setFormatter(console_formatter)
 
     # Add both handlers to the logger
-    logger.addHandler(file_handler)
+    logger.addHandler(buffered_handler)
     logger.addHandler(console_handler)
 
     logger.info(f"Log file is being written to: {log_file_path}")
 
     return logger
 
-# Initialize logging
-logger = setup_logging()
+# Configured by setup_logging() when the script is run, PDF worker processes leave it alone
+logger = logging.getLogger()
 
 # ---------------------- Load Environment Variables ----------------------
 
 load_dotenv()
 
-# Initialize OpenAI API client
-client = OpenAI(
+# Initialize OpenAI API client, async so extractions run concurrently on the event loop
+client = AsyncOpenAI(
     api_key=os.environ.get("OPENAI_API_KEY"),
 )
-openai.api_key = os.getenv("OPENAI_API_KEY")
 ZYTE_API_KEY = os.getenv("ZYTE_API_KEY")
 
+# Google Custom Search JSON API, used instead of scraping Google when both are set
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
+
 # ---------------------- Google Sheets Setup ----------------------
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
@@ -74,7 +114,11 @@ SPREADSHEET_ID = '1eT4ATuwD0PjWAGsGRQ7cGnh5XTN1-WW_8B9BNuiXgiI'
 SHEET_NAME = 'Sheet2'
 RESULT_SHEET_NAME = 'Sheet1'
 
+@lru_cache(maxsize=1)
 def get_google_sheets_service(force_new_token=False):
+    """
+    Build the Sheets service, reusing the cached one so token.json is read and decoded only once.
+    """
     creds = None
     if os.path.exists('token.json') and not force_new_token:
         try:
@@ -108,61 +152,408 @@ def get_google_sheets_service(force_new_token=False):
             logger.info("Saved new token.json file")
 
     try:
-        service = build('sheets', 'v4', credentials=creds)
+        # The bundled discovery document is used, nothing is fetched or cached on disk
+        service = build('sheets', 'v4', credentials=creds, cache_discovery=False, static_discovery=True)
         logger.info("Successfully created Google Sheets service")
         return service
     except HttpError as error:
         logger.error(f"An error occurred while building the service: {error}")
         if "invalid_grant" in str(error) or "invalid_scope" in str(error):
             logger.info("Token seems to be invalid. Attempting to generate a new one.")
+            # Drop any service cached with the revoked credentials before re-authorizing
+            invalidate_service_cache()
             return get_google_sheets_service(force_new_token=True)
         raise
 
+def invalidate_service_cache():
+    """
+    Drop the cached Sheets service, so the next call reloads the credentials.
+    """
+    get_google_sheets_service.cache_clear()
+
+# googleapiclient's httplib2 transport is not thread-safe, so every Sheets
+# request runs on the same single worker thread, off the event loop
+sheets_executor = ThreadPoolExecutor(max_workers=1)
+
+async def sheets_execute(request):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(sheets_executor, request.execute)
+
 # ---------------------- Scraped URLs Management ----------------------
 
-SCRAPED_URLS_FILE = 'scraped_urls.json'
+SCRAPED_URLS_FILE = 'scraped_urls.txt'  # Append-only log, one URL per line
+LEGACY_SCRAPED_URLS_FILE = 'scraped_urls.json'  # Older format, still merged in when present
+COMPACTION_RATIO = 2  # Rewrite the log once it holds this many lines per unique URL
+BLOOM_THRESHOLD = 1_000_000  # Past this many URLs the exact set is swapped for a Bloom filter
+BLOOM_ERROR_RATE = 0.001  # A false positive only means a URL is skipped as already scraped
+
+# Query parameters that only track the click and never change the page content
+TRACKING_PARAMS = frozenset(('fbclid', 'gclid', 'msclkid', 'mc_cid', 'mc_eid'))
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of a URL for dedup: lowercased scheme and host, tracking parameters
+    removed, remaining query sorted, fragment and trailing slash dropped.
+    """
+    try:
+        parts = urllib.parse.urlsplit(url.strip())
+    except ValueError:
+        return url
+    query = urllib.parse.urlencode(sorted(
+        (key, value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    ))
+    return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                                    parts.path.rstrip('/'), query, ''))
+
+class BloomFilter:
+    """
+    Fixed-capacity Bloom filter over a bytearray, about 1.8 bytes per URL at a 0.1% error rate.
+    """
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: two 64-bit halves of one digest generate every probe position
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class ScrapedUrls:
+    """
+    Membership index for scraped URLs. Holds an exact set until it reaches BLOOM_THRESHOLD,
+    then moves to a chain of Bloom filters that each double the previous capacity.
+    URLs are normalized first, so tracking-parameter variants of a page count as one.
+    """
+    def __init__(self):
+        self.urls = set()
+        self.filters: List[BloomFilter] = []
+        self.count = 0
+
+    @property
+    def is_exact(self) -> bool:
+        return not self.filters
+
+    def add(self, url: str):
+        url = normalize_url(url)
+        if self._contains(url):
+            return
+        self.count += 1
+        if self.is_exact:
+            self.urls.add(url)
+            if len(self.urls) >= BLOOM_THRESHOLD:
+                self._switch_to_bloom()
+            return
+        if self.filters[-1].count >= self.filters[-1].capacity:
+            self.filters.append(BloomFilter(self.filters[-1].capacity * 2, BLOOM_ERROR_RATE))
+        self.filters[-1].add(url)
+
+    def _switch_to_bloom(self):
+        bloom = BloomFilter(BLOOM_THRESHOLD * 2, BLOOM_ERROR_RATE)
+        for url in self.urls:
+            bloom.add(url)
+        self.filters.append(bloom)
+        self.urls = set()
+        logger.info(f"Scraped URLs reached {BLOOM_THRESHOLD}, switched to a Bloom filter")
+
+    def _contains(self, url: str) -> bool:
+        if self.is_exact:
+            return url in self.urls
+        return any(url in bloom for bloom in self.filters)
+
+    def __contains__(self, url: str) -> bool:
+        return self._contains(normalize_url(url))
+
+    def __len__(self) -> int:
+        return self.count
+
+def load_scraped_urls() -> ScrapedUrls:
+    scraped = ScrapedUrls()
+    if os.path.exists(LEGACY_SCRAPED_URLS_FILE):
+        try:
+            with open(LEGACY_SCRAPED_URLS_FILE, 'rb') as f:
+                urls = ijson.items(f, 'item') if ijson else json_loads(f.read())
+                for url in urls:
+                    scraped.add(url)
+                logger.info(f"Loaded {len(scraped)} scraped URLs from {LEGACY_SCRAPED_URLS_FILE}")
+        except Exception as e:
+            logger.error(f"Error loading scraped URLs: {e}")
 
-def load_scraped_urls() -> set:
+    line_count = 0
     if os.path.exists(SCRAPED_URLS_FILE):
         try:
+            # Streamed line by line, so a large log never needs a full in-memory copy
             with open(SCRAPED_URLS_FILE, 'r', encoding='utf-8') as f:
-                scraped = set(json.load(f))
-                logger.info(f"Loaded {len(scraped)} scraped URLs from {SCRAPED_URLS_FILE}")
-                return scraped
+                for line in f:
+                    url = line.strip()
+                    if url:
+                        scraped.add(url)
+                        line_count += 1
+                logger.info(f"Loaded {line_count} scraped URL entries from {SCRAPED_URLS_FILE}")
         except Exception as e:
             logger.error(f"Error loading scraped URLs: {e}")
-    return set()
 
-def save_scraped_urls(scraped_urls: set):
+    # Only the exact set can be written back out, a Bloom filter does not keep the URLs
+    if scraped.is_exact and line_count > COMPACTION_RATIO * len(scraped):
+        compact_scraped_urls(scraped.urls)
+    return scraped
+
+def save_scraped_url(url: str):
+    """
+    Append a newly scraped URL to the log, an O(1) write regardless of how many URLs are known.
+    Writes are buffered, flush_scraped_urls() pushes them to disk.
+    """
     try:
-        with open(SCRAPED_URLS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(list(scraped_urls), f)
-            logger.info(f"Saved {len(scraped_urls)} scraped URLs to {SCRAPED_URLS_FILE}")
+        scraped_urls_file.write(url + '\n')
     except Exception as e:
-        logger.error(f"Error saving scraped URLs: {e}")
+        logger.error(f"Error saving scraped URL {url}: {e}")
 
-# Load scraped URLs at the start
-scraped_urls = load_scraped_urls()
+def flush_scraped_urls():
+    try:
+        scraped_urls_file.flush()
+    except Exception as e:
+        logger.error(f"Error flushing scraped URLs: {e}")
+
+def compact_scraped_urls(scraped_urls: set):
+    """
+    Rewrite the log with one line per unique URL, atomically replacing the old file.
+    """
+    temp_file = SCRAPED_URLS_FILE + '.tmp'
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.writelines(url + '\n' for url in scraped_urls)
+        os.replace(temp_file, SCRAPED_URLS_FILE)
+        logger.info(f"Compacted {SCRAPED_URLS_FILE} to {len(scraped_urls)} URLs")
+    except Exception as e:
+        logger.error(f"Error compacting scraped URLs: {e}")
+
+# Loaded by open_scraped_urls() when the run starts, not at import, so PDF worker
+# processes that re-import this module do not load or compact the log again
+scraped_urls = ScrapedUrls()
+scraped_urls_file = None
+
+def open_scraped_urls():
+    """
+    Load the scraped URLs and open the log for appending. The log is kept open for the
+    whole run, so each new URL is a buffered write instead of an open and close.
+    """
+    global scraped_urls, scraped_urls_file
+    scraped_urls = load_scraped_urls()
+    scraped_urls_file = open(SCRAPED_URLS_FILE, 'a', encoding='utf-8', buffering=1 << 16)
+    atexit.register(scraped_urls_file.close)
 
 # ---------------------- Search Engine Configuration ----------------------
 
-# Rate limiting configurations
-GOOGLE_RATE_LIMIT = 2  # seconds between Google requests
-BING_RATE_LIMIT = 2     # seconds between Bing requests
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+              'AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/85.0.4183.102 Safari/537.36')
+
+# Result pages are requested with a rotating browser User-Agent, a single fixed one is throttled sooner
+SEARCH_USER_AGENTS = (
+    USER_AGENT,
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/124.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/17.4 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/123.0.0.0 Safari/537.36',
+)
+
+# Rate limiting configurations, as (requests, seconds) windows
+GOOGLE_RATE_LIMIT = (5, 10)  # at most 5 Google requests start in any 10 seconds
+BING_RATE_LIMIT = (5, 10)     # at most 5 Bing requests start in any 10 seconds
+
+# Result pages are fetched concurrently, at most this many in flight per engine
+SEARCH_PAGE_CONCURRENCY = 2
+GOOGLE_PAGE_WINDOW = 3  # Google pages requested together before checking for enough results
+
+class AsyncRateLimiter:
+    """
+    Sliding-window limiter: at most `max_calls` calls start in any `per_seconds` window,
+    measured on the loop's monotonic clock. Bursts up to the window are let through at once,
+    and a caller only sleeps until the oldest call in a full window has aged out.
+    """
+    def __init__(self, max_calls: int, per_seconds: float):
+        self.max_calls = max_calls
+        self.per_seconds = per_seconds
+        self.calls = deque()  # Start times of recent and reserved calls, in order
+
+    async def __aenter__(self):
+        now = asyncio.get_running_loop().time()
+        while self.calls and self.calls[0] <= now - self.per_seconds:
+            self.calls.popleft()
+        # Reserve a slot before sleeping, so concurrent callers queue up behind it
+        start = now
+        if len(self.calls) >= self.max_calls:
+            start = max(now, self.calls[-self.max_calls] + self.per_seconds)
+        self.calls.append(start)
+        try:
+            await asyncio.sleep(start - now)
+        except asyncio.CancelledError:
+            # The call never started, so its slot goes back to the window
+            self.calls.remove(start)
+            raise
+
+    async def __aexit__(self, *exc_info):
+        return False
 
 # Semaphore to control rate limiting
-google_semaphore = asyncio.Semaphore(1)
-bing_semaphore = asyncio.Semaphore(1)
+google_semaphore = asyncio.Semaphore(SEARCH_PAGE_CONCURRENCY)
+bing_semaphore = asyncio.Semaphore(SEARCH_PAGE_CONCURRENCY)
+google_rate_limiter = AsyncRateLimiter(*GOOGLE_RATE_LIMIT)
+bing_rate_limiter = AsyncRateLimiter(*BING_RATE_LIMIT)
+
+# Google result links are matched directly in the raw HTML, no DOM is built.
+# Google changes its markup, so known layouts are tried in order and the first match wins.
+GOOGLE_RESULT_LINK_PATTERNS = tuple(re.compile(pattern, re.S) for pattern in (
+    rb'class="[^"]*\byuRUbf\b[^"]*"[^>]*>.*?<a\s[^>]*?href="([^"]+)"',
+    rb'class="[^"]*\btF2Cxc\b[^"]*"[^>]*>.*?<a\s[^>]*?href="([^"]+)"',
+    rb'href="(/url\?[^"]+)"',  # Basic HTML layout, every link is a redirect
+))
+
+# Google wraps result links in /url?q=<target>&... redirects on some layouts
+GOOGLE_REDIRECT_RE = re.compile(r'^/url\?(?:[^#]*&)?(?:q|url)=(https?[^&#]+)')
+
+# Bing results pointing at images or PDFs are dropped, checked in one regex pass per link
+BING_SKIPPED_LINK_RE = re.compile(r'\.(?:jpe?g|png|gif|pdf|svg|webp|mp4|zip)(?:$|[?#])', re.I)
 
 # ---------------------- Search Functions ----------------------
-async def get_google_search_results(query: str, start_date: str, end_date: str,
-                                    num_results: int = 10, scraped_urls: set = set(),
+
+def resolve_google_link(href: str) -> Optional[str]:
+    """
+    Return the target URL of a Google result link, unwrapping /url?q= redirects.
+    """
+    if href.startswith('http'):
+        return href
+    match = GOOGLE_REDIRECT_RE.match(href)
+    if match:
+        return urllib.parse.unquote(match.group(1))
+    return None
+
+def parse_google_results(html_bytes: bytes) -> List[str]:
+    """
+    Extract the organic result links from a raw Google result page.
+    """
+    hrefs = next((hrefs for pattern in GOOGLE_RESULT_LINK_PATTERNS
+                  if (hrefs := pattern.findall(html_bytes))), [])
+    results = []
+    for href in hrefs:
+        target = resolve_google_link(unescape(href.decode('utf-8', 'ignore')))
+        # Redirect-style pages also link to Google's own pages, keep only external results
+        if target and 'google.' not in urllib.parse.urlsplit(target).netloc:
+            results.append(target)
+    return results
+
+SHEET_DATE_FORMATS = ['%Y-%m-%d', '%m-%d-%Y', '%Y/%m/%d', '%m/%d/%Y']
+
+def to_search_date(value: str) -> Optional[str]:
+    """
+    Convert a date from the sheet to the YYYYMMDD format used by the Custom Search API.
+    """
+    for date_format in SHEET_DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).strftime('%Y%m%d')
+        except ValueError:
+            continue
+    return None
+
+def parse_bing_results(html: Union[str, bytes]) -> List[str]:
+    """
+    Extract every absolute link from a Bing result page (str or raw bytes) with selectolax.
+    """
+    results = []
+    for anchor in HTMLParser(html, detect_encoding=isinstance(html, bytes)).css('a[href]'):
+        href = anchor.attributes.get('href') or ''
+        if href.startswith('http'):
+            results.append(href)
+    return results
+
+async def collect_result_pages(pages: list, num_results: int) -> List[str]:
+    """
+    Run result page fetches concurrently, each returning (page_number, links).
+    Stops and cancels the remaining fetches once num_results links are collected.
+    Returns the collected links in page order.
+    """
+    tasks = [asyncio.create_task(page) for page in pages]
+    collected = {}
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            page_number, links = await next_page
+            collected[page_number] = links
+            if sum(len(links) for links in collected.values()) >= num_results:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return [link for page_number in sorted(collected) for link in collected[page_number]]
+
+async def get_custom_search_results(query: str, start_date: str, end_date: str,
+                                    num_results: int = 10, scraped_urls: ScrapedUrls = ScrapedUrls(),
+                                    max_pages: int = 10) -> List[str]:
+    """
+    Fetch Google results through the Custom Search JSON API while excluding already scraped URLs.
+    Returns structured results directly, so no result page has to be downloaded and parsed.
+    """
+    logger.info(f"Searching Google Custom Search for query: {query}")
+    # Building the service loads the discovery document, keep it off the event loop as well
+    service = await asyncio.to_thread(build, 'customsearch', 'v1', developerKey=GOOGLE_API_KEY,
+                                      cache_discovery=False, static_discovery=True)
+
+    start, end = to_search_date(start_date), to_search_date(end_date)
+    date_range = f"date:r:{start}:{end}" if start and end else None
+
+    new_results = []
+    for current_page in range(min(max_pages, 10)):  # The API serves at most 100 results
+        request = service.cse().list(q=query, cx=GOOGLE_CSE_ID, num=10,
+                                     start=current_page * 10 + 1, sort=date_range)
+        # The API client is synchronous, keep the event loop free while it runs
+        response = await asyncio.to_thread(request.execute)
+        items = response.get('items', [])
+
+        filtered = [item['link'] for item in items if item['link'] not in scraped_urls]
+        new_results.extend(filtered)
+
+        logger.info(f"Fetched {len(filtered)} new links from Custom Search page {current_page + 1}")
+
+        if len(new_results) >= num_results or len(items) < 10:
+            break
+
+    logger.info(f"Total new Custom Search results found: {len(new_results)}")
+    return new_results[:num_results]
+
+async def get_google_search_results(session: aiohttp.ClientSession, query: str,
+                                    start_date: str, end_date: str,
+                                    num_results: int = 10, scraped_urls: ScrapedUrls = ScrapedUrls(),
                                     max_pages: int = 10) -> List[str]:
     """
     Fetch Google search results while excluding already scraped URLs.
     Implements pagination to fetch more results if needed.
+    Uses the Custom Search JSON API when it is configured.
     Falls back to Bing search if Google fails.
     """
+    if GOOGLE_API_KEY and GOOGLE_CSE_ID:
+        try:
+            return await get_custom_search_results(query, start_date, end_date, num_results,
+                                                   scraped_urls, max_pages)
+        except Exception as e:
+            logger.error(f"Google Custom Search failed: {e}")
+            logger.info("Falling back to scraping Google search")
+
     start_date = start_date.replace('-', '/')
     end_date = end_date.replace('-', '/')
     query_parts = query.lower().split()
@@ -170,43 +561,39 @@ async def get_google_search_results(query: str, start_date: str, end_date: str,
     try:
         logger.info(f"Searching Google for query: {query}")
         # query_encoded = urllib.parse.quote_plus(f"{query} after:{start_date} before:{end_date}")
+        results_seen = 0
+
+        async def fetch_page(current_page: int) -> tuple:
+            nonlocal results_seen
+            query_encoded = f"%27{query_edited}%27&sca_esv=47b2934ea174e9e2&rlz=1C1CHBD_en-GBPK1108PK1108&tbs=cdr:1,cd_min:{start_date},cd_max:{end_date}&ei=95YaZ5uUBbnbptQPi53AqQc&start={current_page*10}"
+            # start = current_page * 10  # Google uses 'start' parameter for pagination
+            url = f"https://www.google.com/search?q={query_encoded}" #&num=10&start={start}"
+
+            async with google_semaphore, google_rate_limiter:
+                async with session.get(url, headers={'User-Agent': random.choice(SEARCH_USER_AGENTS)}) as response:
+                    if response.status != 200:
+                        logger.error(f"Google search failed with status code: {response.status}")
+                        raise Exception("Google search failed")
+
+                    results = parse_google_results(await response.read())
+
+            results_seen += len(results)
+            # Filter out already scraped URLs
+            filtered = [link for link in results if link not in scraped_urls]
+            logger.info(f"Fetched {len(filtered)} new links from Google page {current_page}")
+            return current_page, filtered
+
         new_results = []
         current_page = 0
 
         while len(new_results) < num_results:
-            query_encoded = f"%27{query_edited}%27&sca_esv=47b2934ea174e9e2&rlz=1C1CHBD_en-GBPK1108PK1108&tbs=cdr:1,cd_min:{start_date},cd_max:{end_date}&ei=95YaZ5uUBbnbptQPi53AqQc&start={current_page*10}"
-            async with google_semaphore:
-                await asyncio.sleep(GOOGLE_RATE_LIMIT)  # Rate limiting
-
-                # start = current_page * 10  # Google uses 'start' parameter for pagination
-                url = f"https://www.google.com/search?q={query_encoded}" #&num=10&start={start}"
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                                  'AppleWebKit/537.36 (KHTML, like Gecko) '
-                                  'Chrome/85.0.4183.102 Safari/537.36'
-                }
-
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, headers=headers) as response:
-                        if response.status != 200:
-                            logger.error(f"Google search failed with status code: {response.status}")
-                            raise Exception("Google search failed")
-
-                        html = await response.text()
-                        soup = BeautifulSoup(html, 'html.parser')
-                        results = []
-                        for item in soup.find_all('div', class_='yuRUbf'):  # This class may change
-                            link = item.find('a', href=True)
-                            if link and link['href'].startswith('http'):
-                                results.append(link['href'])
-
-                        # Filter out already scraped URLs
-                        filtered = [link for link in results if link not in scraped_urls]
-                        new_results.extend(filtered)
-
-                        logger.info(f"Fetched {len(filtered)} new links from Google page {current_page}")
-
-            current_page += 1
+            results_seen = 0
+            window = range(current_page, current_page + GOOGLE_PAGE_WINDOW)
+            new_results.extend(await collect_result_pages([fetch_page(page) for page in window],
+                                                          num_results - len(new_results)))
+            if not results_seen:
+                break  # Past the last page of results
+            current_page += GOOGLE_PAGE_WINDOW
 
         logger.info(f"Total new Google search results found: {len(new_results)}")
         return new_results[:num_results]
@@ -214,10 +601,11 @@ async def get_google_search_results(query: str, start_date: str, end_date: str,
         logger.error(f"Google search failed: {e}")
         logger.info("Falling back to Bing search")
         # Fallback to Bing search
-        return await get_bing_search_results(query, start_date, end_date, num_results, scraped_urls, max_pages)
+        return await get_bing_search_results(session, query, start_date, end_date, num_results, scraped_urls, max_pages)
 
-async def get_bing_search_results(query: str, start_date: str, end_date: str,
-                                  num_results: int = 10, scraped_urls: set = set(),
+async def get_bing_search_results(session: aiohttp.ClientSession, query: str,
+                                  start_date: str, end_date: str,
+                                  num_results: int = 10, scraped_urls: ScrapedUrls = ScrapedUrls(),
                                   max_pages: int = 10) -> List[str]:
     """
     Fetch Bing search results while excluding already scraped URLs.
@@ -226,46 +614,29 @@ async def get_bing_search_results(query: str, start_date: str, end_date: str,
     try:
         logger.info(f"Searching Bing for query: {query}")
         query_encoded = urllib.parse.quote_plus(f"{query} after:{start_date} before:{end_date}")
-        new_results = []
-        current_page = 0
-
-        while current_page < max_pages:
-            async with bing_semaphore:
-                await asyncio.sleep(BING_RATE_LIMIT)  # Rate limiting
-
-                first = current_page * 10 + 1  # Bing uses 'first' parameter for pagination
-                url = f"https://www.bing.com/search?q={query_encoded}&count=10&first={first}"
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                                  'AppleWebKit/537.36 (KHTML, like Gecko) '
-                                  'Chrome/85.0.4183.102 Safari/537.36'
-                }
 
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, headers=headers) as response:
-                        if response.status != 200:
-                            logger.error(f"Bing search failed with status code: {response.status}")
-                            break  # Stop trying Bing if a page fails
+        async def fetch_page(current_page: int) -> tuple:
+            first = current_page * 10 + 1  # Bing uses 'first' parameter for pagination
+            url = f"https://www.bing.com/search?q={query_encoded}&count=10&first={first}"
 
-                        html = await response.text()  
-                        soup = BeautifulSoup(html, 'html.parser')
-                        results = [item['href'] for item in soup.find_all('a', href=True)
-                                   if item['href'].startswith('http')]
+            async with bing_semaphore, bing_rate_limiter:
+                async with session.get(url, headers={'User-Agent': random.choice(SEARCH_USER_AGENTS)}) as response:
+                    if response.status != 200:
+                        logger.error(f"Bing search failed with status code: {response.status}")
+                        return current_page, []
 
-                        # Filter out already scraped URLs and non-organic links
-                        filtered = []
-                        for link in results:
-                            if link not in scraped_urls and not any(domain in link for domain in ['.jpg', '.png', '.pdf', '.gif']):
-                                filtered.append(link)
+                    results = parse_bing_results(await response.read())
 
-                        new_results.extend(filtered)
+            # Filter out already scraped URLs and non-organic links
+            filtered = []
+            for link in results:
+                if link not in scraped_urls and not BING_SKIPPED_LINK_RE.search(link):
+                    filtered.append(link)
 
-                        logger.info(f"Fetched {len(filtered)} new links from Bing page {current_page + 1}")
+            logger.info(f"Fetched {len(filtered)} new links from Bing page {current_page + 1}")
+            return current_page, filtered
 
-                        if len(new_results) >= num_results:
-                            break
-
-                current_page += 1
+        new_results = await collect_result_pages([fetch_page(page) for page in range(max_pages)], num_results)
 
         logger.info(f"Total new Bing search results found: {len(new_results)}")
         return new_results[:num_results]
@@ -275,36 +646,120 @@ async def get_bing_search_results(query: str, start_date: str, end_date: str,
 
 # ---------------------- Content Fetching Functions ----------------------
 
-async def fetch_content_with_zyte(url: str) -> Optional[str]:
+NON_TEXT_TAGS = ['script', 'style', 'noscript']
+WHITESPACE_RE = re.compile(r'\s+')
+
+MAX_TEXT_CHARS = 25000  # Characters of page text sent to OpenAI
+MAX_HTML_BYTES = 2 * 1024 * 1024  # HTML pages are not downloaded past this size
+ZYTE_API_URL = "https://api.zyte.com/v1/extract"
+LARGE_ZYTE_BODY_CHARS = 200 * 1024  # Base64 bodies above this size are decoded in a thread
+STREAM_CHUNK_SIZE = 32768
+ZYTE_RETRIES = 3  # Extra attempts for throttled or failed Zyte requests
+ZYTE_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504, 520))
+RETRY_BACKOFF = 1.0  # Seconds before the first retry, doubled on each following one
+
+# Responses that can never contain article text
+SKIPPED_CONTENT_TYPES = ('image/', 'video/', 'audio/', 'font/')
+BINARY_URL_RE = re.compile(r'\.(?:jpe?g|png|gif|webp|svg|ico|bmp|mp4|mov|avi|webm|mp3|wav|zip|gz|exe|dmg)(?:$|[?#])', re.I)
+MAX_PDF_BYTES = 20 * 1024 * 1024  # PDFs larger than this are not downloaded
+PDF_URL_RE = re.compile(r'\.pdf(?:$|[?#])', re.I)  # Also matches PDF links with a query string
+
+# Leading bytes of files that servers sometimes send under an HTML or generic content type
+PDF_MAGIC = b'%PDF'
+BINARY_MAGIC = (b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'RIFF', b'PK\x03\x04', b'\x1f\x8b')
+
+LARGE_PDF_BYTES = 5 * 1024 * 1024  # PDFs above this size are spooled to disk and parsed in a separate process
+MAX_PDF_PAGES = 50  # Only the leading pages are parsed, bounding CPU time on huge documents
+PDF_WORKERS = min(4, os.cpu_count() or 1)
+pdf_process_pool = None  # Started on the first large PDF, shut down when main() exits
+
+def get_pdf_process_pool() -> ProcessPoolExecutor:
+    global pdf_process_pool
+    if pdf_process_pool is None:
+        pdf_process_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return pdf_process_pool
+
+def html_to_text(html) -> str:
+    """
+    Flatten an HTML document (str or bytes) to its visible text using selectolax,
+    collapsing the whitespace runs left inside text nodes to single spaces.
+    """
+    tree = HTMLParser(html, detect_encoding=isinstance(html, bytes))
+    tree.strip_tags(NON_TEXT_TAGS)
+    root = tree.body or tree.root
+    if root is None:
+        return ""
+    return WHITESPACE_RE.sub(' ', root.text(separator=' ', strip=True))
+
+async def fetch_content_with_zyte(session: aiohttp.ClientSession, url: str) -> Optional[str]:
+    if not ZYTE_API_KEY:
+        logger.error("ZYTE_API_KEY is not set, cannot fetch content through Zyte")
+        return None
+
     logger.info(f"Fetching content from URL: {url}")
     try:
-        api_response = requests.post(
-            "https://api.zyte.com/v1/extract",
-            auth=(ZYTE_API_KEY, ""),
-            json={
-                "url": url,
-                "httpResponseBody": True,
-            },
-        )
-        api_response.raise_for_status()
-        response_json = api_response.json()
+        # Zyte answers 429 and 5xx when it is throttling or the site failed, both are worth retrying
+        for attempt in range(ZYTE_RETRIES + 1):
+            delay = RETRY_BACKOFF * 2 ** attempt
+            try:
+                async with session.post(
+                    ZYTE_API_URL,
+                    auth=aiohttp.BasicAuth(ZYTE_API_KEY, ""),
+                    json={
+                        "url": url,
+                        "httpResponseBody": True,
+                        "httpResponseHeaders": True,
+                    },
+                    timeout=ZYTE_TIMEOUT,
+                ) as api_response:
+                    if api_response.status in ZYTE_RETRY_STATUSES and attempt < ZYTE_RETRIES:
+                        retry_after = api_response.headers.get("Retry-After", "")
+                        if retry_after.isdigit():
+                            delay = max(delay, int(retry_after))
+                        logger.info(f"Zyte returned {api_response.status} for {url}, retrying in {delay}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    api_response.raise_for_status()
+                    response_json = await api_response.json(loads=json_loads)
+                    break
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == ZYTE_RETRIES:
+                    raise
+                logger.info(f"Zyte request for {url} failed ({e!r}), retrying in {delay}s")
+                await asyncio.sleep(delay)
         
         if "httpResponseBody" not in response_json:
             logger.error("Error: 'httpResponseBody' not found in API response")
             logger.error(f"API Response: {response_json}")
             return None
         
-        http_response_body: bytes = base64.b64decode(response_json["httpResponseBody"])
+        # Decide from the headers before spending time on decoding the body
+        content_type = next((header["value"].lower() for header in response_json.get("httpResponseHeaders", [])
+                             if header.get("name", "").lower() == "content-type"), "")
+        if content_type.startswith(SKIPPED_CONTENT_TYPES):
+            logger.info(f"Skipping {content_type} content: {url}")
+            return ""
+
+        encoded_body = response_json["httpResponseBody"]
+        if len(encoded_body) > LARGE_ZYTE_BODY_CHARS:
+            # Decoding a large body takes long enough to stall other fetches
+            http_response_body: bytes = await asyncio.to_thread(base64.b64decode, encoded_body)
+        else:
+            http_response_body: bytes = base64.b64decode(encoded_body)
         
-        if url.lower().endswith('.pdf'):
+        if http_response_body.startswith(BINARY_MAGIC):
+            logger.info(f"Skipping binary content: {url}")
+            return ""
+
+        if (PDF_URL_RE.search(url) or content_type.startswith('application/pdf')
+                or http_response_body.startswith(PDF_MAGIC)):
             logger.info(f"PDF detected: {url}")
             return await extract_text_from_pdf(http_response_body)
         
-        soup = BeautifulSoup(http_response_body, 'html.parser')
-        text = soup.get_text(separator=' ', strip=True)
+        text = await asyncio.to_thread(html_to_text, http_response_body)
         logger.info(f"Fetched {len(text)} characters of text from {url}")
         return text
-    except requests.RequestException as e:
+    except aiohttp.ClientError as e:
         logger.error(f"Request error while fetching {url}: {e}")
     except ValueError as e:
         logger.error(f"JSON decoding error for {url}: {e}")
@@ -312,38 +767,78 @@ async def fetch_content_with_zyte(url: str) -> Optional[str]:
         logger.error(f"An unexpected error occurred while fetching {url}: {e}")
     return None
 
-async def fetch_content_from_url(url: str) -> Optional[str]:
+async def fetch_content_from_url(session: aiohttp.ClientSession, url: str) -> Optional[str]:
     """
     Asynchronously fetch content from a URL, handling both HTML and PDF content.
     
     Args:
+        session (aiohttp.ClientSession): The shared session used for the request
         url (str): The URL to fetch content from
         
     Returns:
-        Optional[str]: The extracted text content, or None if the fetch fails
+        Optional[str]: The extracted text content, an empty string if the URL
+        points to content without article text, or None if the fetch fails
     """
+    if BINARY_URL_RE.search(url):
+        logger.info(f"Skipping binary URL: {url}")
+        return ""
+
     logger.info(f"Fetching content from URL: {url}")
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                content = await response.read()
-                
-                if url.lower().endswith('.pdf'):
-                    logger.info(f"PDF detected: {url}")
-                    return await extract_text_from_pdf(content)
-                
-                # Attempt to decode the content with UTF-8, fallback to ISO-8859-1
-                try:
-                    html_content = content.decode('utf-8')
-                except UnicodeDecodeError:
+        async with session.get(url) as response:
+            response.raise_for_status()
+
+            # Decide from the headers alone, before any of the body is downloaded
+            content_type = response.content_type
+            if content_type.startswith(SKIPPED_CONTENT_TYPES):
+                logger.info(f"Skipping {content_type} content: {url}")
+                return ""
+            
+            if content_type == 'application/pdf' or PDF_URL_RE.search(url):
+                logger.info(f"PDF detected: {url}")
+                if (response.content_length or 0) > MAX_PDF_BYTES:
+                    logger.info(f"Skipping PDF of {response.content_length} bytes: {url}")
+                    return ""
+                pdf = await read_pdf_body(response, url)
+                if pdf is None:
+                    return ""
+                return await extract_text_from_pdf(pdf)
+            
+            # At most MAX_TEXT_CHARS characters of text are sent to OpenAI,
+            # so stream the page and stop reading once it is past MAX_HTML_BYTES
+            buffer = bytearray()
+            truncated = False
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                if not buffer:
+                    # The content type can be wrong, check the leading bytes before parsing as HTML
+                    if chunk.startswith(BINARY_MAGIC):
+                        logger.info(f"Skipping binary content: {url}")
+                        return ""
+                    if chunk.startswith(PDF_MAGIC):
+                        logger.info(f"PDF detected: {url}")
+                        pdf = await read_pdf_body(response, url, prefix=chunk)
+                        return await extract_text_from_pdf(pdf) if pdf is not None else ""
+                buffer.extend(chunk)
+                if len(buffer) >= MAX_HTML_BYTES:
+                    logger.info(f"Stopped reading {url} after {len(buffer)} bytes")
+                    truncated = True
+                    break
+            content = bytes(buffer)
+            
+            # Attempt to decode the content with UTF-8, fallback to ISO-8859-1
+            try:
+                html_content = content.decode('utf-8')
+            except UnicodeDecodeError as e:
+                # A truncated body can end inside a multi-byte character, drop just that character
+                if truncated and e.start >= len(content) - 3:
+                    html_content = content[:e.start].decode('utf-8')
+                else:
                     html_content = content.decode('iso-8859-1')
-                
-                soup = BeautifulSoup(html_content, 'html.parser')
-                text = soup.get_text(separator=' ', strip=True)
-                logger.info(f"Fetched {len(text)} characters of text from {url}")
-                return text
+            
+            text = await asyncio.to_thread(html_to_text, html_content)
+            logger.info(f"Fetched {len(text)} characters of text from {url}")
+            return text
                 
     except aiohttp.ClientError as e:
         logger.error(f"Request error while fetching {url}: {e}")
@@ -354,20 +849,87 @@ async def fetch_content_from_url(url: str) -> Optional[str]:
     
     return None
 
-async def extract_text_from_pdf(pdf_content: bytes) -> str:
+async def read_pdf_body(response: aiohttp.ClientResponse, url: str,
+                        prefix: bytes = b'') -> Union[bytes, str, None]:
+    """
+    Stream a PDF body in chunks, spilling it to a temporary file once it passes LARGE_PDF_BYTES.
+    `prefix` holds any part of the body that was already read from the response.
+    Returns the PDF bytes, the path of the temporary file, or None if it exceeds MAX_PDF_BYTES.
+    """
+    buffer = bytearray(prefix)
+    spool = None
+    size = len(prefix)
+    try:
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_PDF_BYTES:
+                logger.info(f"Skipping PDF larger than {MAX_PDF_BYTES} bytes: {url}")
+                return None
+            if spool is None and size > LARGE_PDF_BYTES:
+                spool = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+                spool.write(buffer)
+                buffer = None
+            if spool is None:
+                buffer.extend(chunk)
+            else:
+                spool.write(chunk)
+
+        if spool is None:
+            return bytes(buffer)
+        spool.close()
+        path, spool = spool.name, None
+        return path
+    finally:
+        # Only reached with an open spool when the PDF was skipped or the download failed
+        if spool is not None:
+            spool.close()
+            os.remove(spool.name)
+
+def _extract_pdf_text(pdf_content: Union[bytes, str], first_page: int = 0,
+                      last_page: int = MAX_PDF_PAGES) -> str:
+    """
+    Extract the text of pages [first_page, last_page) of a PDF given as bytes or as a file path.
+    """
+    if isinstance(pdf_content, str):
+        doc = fitz.open(pdf_content)
+    else:
+        doc = fitz.open(stream=pdf_content, filetype="pdf")
+    with doc:
+        return "\n".join(doc[i].get_text("text") for i in range(first_page, min(doc.page_count, last_page)))
+
+async def extract_text_from_pdf(pdf_content: Union[bytes, str]) -> str:
+    """
+    Extract the text of a PDF given as bytes or as the path of a spooled temporary file.
+    A temporary file is removed once it has been parsed.
+    """
     logger.info("Extracting text from PDF")
     try:
-        pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_content))
-        text = ""
-        for page in pdf_reader.pages:
-            extracted = page.extract_text()
-            if extracted:
-                text += extracted + "\n"
+        if isinstance(pdf_content, str) or len(pdf_content) > LARGE_PDF_BYTES:
+            # Large PDFs would hold the GIL for seconds, parse them in a worker process.
+            # A spooled file is passed by path, so every worker can open it and parse its
+            # own range of pages in parallel
+            loop = asyncio.get_running_loop()
+            pool = get_pdf_process_pool()
+            if isinstance(pdf_content, str):
+                step = -(-MAX_PDF_PAGES // PDF_WORKERS)
+                parts = await asyncio.gather(*(
+                    loop.run_in_executor(pool, _extract_pdf_text, pdf_content, start, start + step)
+                    for start in range(0, MAX_PDF_PAGES, step)
+                ))
+                text = "\n".join(part for part in parts if part)
+            else:
+                text = await loop.run_in_executor(pool, _extract_pdf_text, pdf_content)
+        else:
+            # PyMuPDF parsing is CPU-bound, run it in a thread to keep the event loop free
+            text = await asyncio.to_thread(_extract_pdf_text, pdf_content)
         logger.info(f"Extracted {len(text)} characters from PDF")
         return text
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {e}")
         return ""
+    finally:
+        if isinstance(pdf_content, str):
+            os.remove(pdf_content)
         
 # ---------------------- OpenAI Paragraph Extraction ----------------------
 class ParagraphResponse(BaseModel):
@@ -386,161 +948,518 @@ class ParagraphResponse(BaseModel):
     location: Optional[str] = Field(description="Any specific location within the country mentioned in the article")  # Any Specific location within the country mentioned in the article
     author: Optional[str] = Field(description="The author of the article")  # The author of the article
     references: Optional[List[str]] = Field(description='["Any references or citations in the article"]')  # Any references or citations in the article
-    
-def extract_relevant_data(text: str, query: str, instructions: str) -> ParagraphResponse:
-    logger.info("Extracting relevant Data with OpenAI")
-    system_prompt = (
-        "You are an advanced data extraction assistant. Your task is to read the provided text thoroughly, "
-        "analyze each paragraph, and extract a paragraph and information relevant to the given query and instructions. "
-        "Focus particularly on paragraphs that include numerical data such as Users, Sales, Revenues, Turnover, "
-        "Stores, Dispensaries, Licenses, Pounds, Ounces, or similar metrics. Your goal is to extract the most "
-        "pertinent information that aligns with the given criteria and structure it according to the specified format."
-    )
-        
-    user_prompt = (
-        f"Query: '{query}'\n"
-        f"Instructions: {instructions if instructions else 'No specific instructions provided.'}\n\n"
-        f"Text: {text[:25000]}\n\n"
-        "Extract and return the information in JSON format:\n"
-        "Ensure all fields are present. Use '--' for unavailable information. Do not include any explanations or additional text outside the JSON structure."
-    )
 
+class DocumentParagraphResponse(ParagraphResponse):
+    document: int = Field(description="The number of the document this extraction belongs to")
+
+class BatchParagraphResponse(BaseModel):
+    items: List[DocumentParagraphResponse] = Field(description="One extraction per document, in document order")
+
+def make_schema_strict(schema: dict) -> dict:
+    """
+    Tighten a pydantic JSON schema, in place, for OpenAI's strict structured outputs:
+    every object requires all of its properties and allows no others, and no defaults are set.
+    """
+    schema.pop('default', None)
+    if 'properties' in schema:
+        schema['additionalProperties'] = False
+        schema['required'] = list(schema['properties'])
+        for prop in schema['properties'].values():
+            make_schema_strict(prop)
+    for definition in schema.get('$defs', {}).values():
+        make_schema_strict(definition)
+    if isinstance(schema.get('items'), dict):
+        make_schema_strict(schema['items'])
+    for variant in schema.get('anyOf', []):
+        make_schema_strict(variant)
+    return schema
+
+def json_schema_format(model: type) -> dict:
+    """
+    Build the strict json_schema response_format the SDK would derive from a model on every call.
+    """
+    return {"type": "json_schema", "json_schema": {
+        "name": model.__name__, "schema": make_schema_strict(model.model_json_schema()), "strict": True}}
+
+# Derived once at import instead of once per request
+RESPONSE_FORMATS = {model: json_schema_format(model) for model in (ParagraphResponse, BatchParagraphResponse)}
+
+# Returned when an OpenAI request fails, shared by every failed extraction and never modified
+FAILED_EXTRACTION = ParagraphResponse(
+    content='--',
+    title='--',
+    subtitle='--',
+    score=0.0,
+    keywords=[],
+    category='--',
+    date='--',
+    source='--',
+    numeric_value=None,
+    unit='--',
+    type='--',
+    country='--',
+    location='--',
+    author='--',
+    references=[]
+)
+
+# ---------------------- OpenAI Extraction Cache ----------------------
+
+EXTRACTION_CACHE_FILE = '.openai_cache'
+
+# shelve is not safe for concurrent access, so the shelf is opened once and every
+# lookup and write runs on this single worker thread, off the event loop
+cache_executor = ThreadPoolExecutor(max_workers=1)
+extraction_cache = None  # Opened by open_extraction_cache when the run starts
+
+def open_extraction_cache():
+    global extraction_cache
     try:
-        response = client.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            response_format=ParagraphResponse,        
-        )
-        result = response.choices[0].message.parsed
-        if result.content is None:
-            return check_again_in_openai(text, query, instructions)
-        return result
+        extraction_cache = shelve.open(EXTRACTION_CACHE_FILE)
     except Exception as e:
-        logger.error(f"Error calling OpenAI API: {e}")
-        return ParagraphResponse(
-            content='--',
-            title='--',
-            subtitle='--',
-            score=0.0,
-            keywords=[],
-            category='--',
-            date='--',
-            source='--',
-            numeric_value=None,
-            unit='--',
-            type='--',
-            country='--',
-            location='--',
-            author='--',
-            references=[]
-        )
+        logger.error(f"Error opening OpenAI cache, extractions will not be cached: {e}")
+
+def close_extraction_cache():
+    global extraction_cache
+    if extraction_cache is not None:
+        extraction_cache.close()
+        extraction_cache = None
+
+def extraction_cache_key(text: str, query: str, instructions: str) -> str:
+    # Case and spacing variants of the same query or instructions share an entry
+    query = ' '.join(query.lower().split())
+    instructions = ' '.join((instructions or '').lower().split())
+    payload = '\x00'.join([query, instructions, text])
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+def _read_cached_extractions(keys: List[str]) -> List[tuple]:
+    results = []
+    for key in keys:
+        if extraction_cache is None or key not in extraction_cache:
+            results.append((False, None))
+            continue
+        data = extraction_cache[key]
+        results.append((True, ParagraphResponse(**data) if data is not None else None))
+    return results
+
+def _write_cached_extraction(key: str, data: Optional[dict]):
+    if extraction_cache is not None:
+        extraction_cache[key] = data
+
+async def get_cached_extractions(keys: List[str]) -> List[tuple]:
+    """
+    Look up previous extractions in one trip to the cache thread.
+    Returns a (found, result) tuple per key, result may be None.
+    """
+    try:
+        return await asyncio.get_running_loop().run_in_executor(cache_executor, _read_cached_extractions, keys)
+    except Exception as e:
+        logger.error(f"Error reading OpenAI cache: {e}")
+        return [(False, None)] * len(keys)
 
-def check_again_in_openai(text: str, query: str, instructions: str) -> ParagraphResponse:
-    logger.info("Checking again with OpenAI")
-    system_prompt = (
-        "You are an advanced data extraction assistant. Your task is to read the provided text thoroughly, "
-        "analyze each paragraph, and extract information relevant to the given query and instructions. "
-        "Main task is to extract a paragraph from the given text that contains information relevant to the given query and instructions. "
-        "Focus particularly on paragraphs that include numerical data such as Users, Sales, Revenues, Turnover, "
-        "Stores, Dispensaries, Licenses, Pounds, Ounces, or similar metrics. Your goal is to extract the most "
-        "pertinent information that aligns with the given criteria and structure it according to the specified format."
-        "I am 100% sure that a relevant paragraph exists in the text. Please extract the most relevant paragraph."
-    )
-    user_prompt = (
-        f"Query: '{query}'\n"
-        f"Instructions: {instructions if instructions else 'No specific instructions provided.'}\n\n"
-        f"Text: {text[:25000]}\n\n"
-        "Extract and return the information in JSON format:\n"
-        "Ensure all fields are present. Use '--' for unavailable information. Do not include any explanations or additional text outside the JSON structure."
-    )
+async def get_cached_extraction(key: str) -> tuple:
+    return (await get_cached_extractions([key]))[0]
 
+async def cache_extraction(key: str, result: Optional[ParagraphResponse]):
+    data = result.model_dump() if result is not None else None
     try:
-        response = client.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            response_format=ParagraphResponse,        
-        )
-        result = response.choices[0].message.parsed
+        await asyncio.get_running_loop().run_in_executor(cache_executor, _write_cached_extraction, key, data)
+    except Exception as e:
+        logger.error(f"Error writing OpenAI cache: {e}")
+
+# ---------------------- OpenAI Prompts ----------------------
+
+# Built once at import, each call only formats the user message
+EXTRACTION_SYSTEM_MESSAGE = {"role": "system", "content": (
+    "You are an advanced data extraction assistant. Your task is to read the provided text thoroughly, "
+    "analyze each paragraph, and extract a paragraph and information relevant to the given query and instructions. "
+    "Focus particularly on paragraphs that include numerical data such as Users, Sales, Revenues, Turnover, "
+    "Stores, Dispensaries, Licenses, Pounds, Ounces, or similar metrics. Your goal is to extract the most "
+    "pertinent information that aligns with the given criteria and structure it according to the specified format."
+)}
+
+RECHECK_SYSTEM_MESSAGE = {"role": "system", "content": (
+    "You are an advanced data extraction assistant. Your task is to read the provided text thoroughly, "
+    "analyze each paragraph, and extract information relevant to the given query and instructions. "
+    "Main task is to extract a paragraph from the given text that contains information relevant to the given query and instructions. "
+    "Focus particularly on paragraphs that include numerical data such as Users, Sales, Revenues, Turnover, "
+    "Stores, Dispensaries, Licenses, Pounds, Ounces, or similar metrics. Your goal is to extract the most "
+    "pertinent information that aligns with the given criteria and structure it according to the specified format."
+    "I am 100% sure that a relevant paragraph exists in the text. Please extract the most relevant paragraph."
+)}
+
+BATCH_SYSTEM_MESSAGE = {"role": "system", "content": (
+    "You are an advanced data extraction assistant. You will receive several numbered documents. "
+    "For each document, read the text thoroughly, analyze each paragraph, and extract a paragraph and "
+    "information relevant to the given query and instructions. "
+    "Focus particularly on paragraphs that include numerical data such as Users, Sales, Revenues, Turnover, "
+    "Stores, Dispensaries, Licenses, Pounds, Ounces, or similar metrics. Your goal is to extract the most "
+    "pertinent information that aligns with the given criteria and structure it according to the specified format."
+)}
+
+NO_INSTRUCTIONS = 'No specific instructions provided.'
+
+# The fixed output rules come first and the query and text last, so every request of a kind
+# starts with the same bytes and OpenAI can serve that prefix from its prompt cache
+USER_PROMPT_TEMPLATE = (
+    "Extract and return the information in JSON format:\n"
+    "Ensure all fields are present. Use '--' for unavailable information. Do not include any explanations or additional text outside the JSON structure.\n\n"
+    "Query: '{query}'\n"
+    "Instructions: {instructions}\n\n"
+    "Text: {text}"
+)
+
+BATCH_USER_PROMPT_TEMPLATE = (
+    "Extract and return the information in JSON format, with exactly one item per document and its document number:\n"
+    "Ensure all fields are present. Use '--' for unavailable information. Do not include any explanations or additional text outside the JSON structure.\n\n"
+    "Query: '{query}'\n"
+    "Instructions: {instructions}\n\n"
+    "{documents}"
+)
+
+MAX_TEXT_TOKENS = 6000  # Tokens of page text sent to OpenAI, when tiktoken is available
+PASSAGE_CHARS = 1000  # Long texts are split into passages of about this size and ranked against the query
+SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+
+@lru_cache(maxsize=1)
+def get_text_encoding():
+    """
+    Load the gpt-4o tokenizer once. Returns None if tiktoken is missing or cannot load it.
+    The first call may download the BPE file, main() makes it on a thread at startup.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model("gpt-4o")
+    except Exception as e:
+        logger.error(f"Error loading the gpt-4o tokenizer: {e}")
+        return None
+
+def split_passages(text: str) -> List[str]:
+    """
+    Group the sentences and lines of a text into passages of about PASSAGE_CHARS characters.
+    Text without sentence breaks is cut at the last space before PASSAGE_CHARS, so no
+    passage is much longer than that.
+    """
+    passages, current, size = [], [], 0
+    for sentence in SENTENCE_BREAK_RE.split(text):
+        if not sentence:
+            continue
+        while len(sentence) > PASSAGE_CHARS:
+            if current:
+                passages.append(' '.join(current))
+                current, size = [], 0
+            cut = sentence.rfind(' ', PASSAGE_CHARS // 2, PASSAGE_CHARS)
+            if cut == -1:
+                cut = PASSAGE_CHARS
+            passages.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if not sentence:
+            continue
+        current.append(sentence)
+        size += len(sentence) + 1
+        if size >= PASSAGE_CHARS:
+            passages.append(' '.join(current))
+            current, size = [], 0
+    if current:
+        passages.append(' '.join(current))
+    return passages
+
+@lru_cache(maxsize=256)
+def query_pattern(query: str) -> Optional[re.Pattern]:
+    """
+    Compile the words of a query that are long enough to be worth matching into one
+    case-insensitive alternation, so a text is scanned once for all of them.
+    Returns None if the query has no such words.
+    """
+    terms = {term for term in query.lower().split() if len(term) > 2}
+    if not terms:
+        return None
+    # Longest first, so a term is not cut short by one of its prefixes
+    return re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.I)
+
+def mentions_query(text: str, query: str) -> bool:
+    """
+    Whether the text contains any term of the query. Queries without such terms match everything.
+    """
+    pattern = query_pattern(query)
+    return pattern is None or pattern.search(text) is not None
+
+def prepare_text(text: str, query: str) -> str:
+    """
+    Fit page text into the OpenAI budget. Texts over MAX_TEXT_CHARS keep the passages that
+    mention the most query terms, in document order, or their leading text if none do.
+    The result is then cut at MAX_TEXT_TOKENS tokens.
+    """
+    if len(text) > MAX_TEXT_CHARS:
+        pattern = query_pattern(query)
+        passages = split_passages(text)
+        # A passage scores the number of distinct query terms it mentions
+        scores = [len({match.lower() for match in pattern.findall(passage)}) if pattern else 0
+                  for passage in passages]
+        selected, size = [], 0
+        if any(scores):
+            for i in sorted(range(len(passages)), key=lambda i: -scores[i]):
+                if size + len(passages[i]) > MAX_TEXT_CHARS:
+                    continue
+                selected.append(i)
+                size += len(passages[i]) + 1
+        # Without a matching passage that fits, the leading text is sent as before
+        if selected:
+            text = ' '.join(passages[i] for i in sorted(selected))
+        else:
+            text = text[:MAX_TEXT_CHARS]
+
+    encoding = get_text_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) > MAX_TEXT_TOKENS:
+            text = encoding.decode(tokens[:MAX_TEXT_TOKENS])
+    return text
+
+async def prepare_text_async(text: str, query: str) -> str:
+    """
+    prepare_text, on a worker thread for texts long enough that splitting and encoding
+    them would stall the event loop.
+    """
+    if len(text) > MAX_TEXT_CHARS:
+        return await asyncio.to_thread(prepare_text, text, query)
+    return prepare_text(text, query)
+
+async def build_user_message(query: str, instructions: str, text: str) -> dict:
+    return {"role": "user", "content": USER_PROMPT_TEMPLATE.format(
+        query=query, instructions=instructions or NO_INSTRUCTIONS, text=await prepare_text_async(text, query))}
+
+# ---------------------- OpenAI Requests ----------------------
+
+OPENAI_TIMEOUT = 90  # Seconds a completion may take, including the SDK's own retries
+
+# Extractions try the cheaper, faster model first and only go to the stronger one
+# when it finds nothing or scores its paragraph below FAST_MODEL_MIN_SCORE
+MODEL_FAST = "gpt-4o-mini"
+MODEL_STRONG = "gpt-4o"
+FAST_MODEL_MIN_SCORE = 60
+
+def needs_strong_model(result: ParagraphResponse) -> bool:
+    return result.content is None or (result.score or 0) < FAST_MODEL_MIN_SCORE
+
+OPENAI_CONCURRENCY = 5  # Maximum number of OpenAI requests in flight
+
+# Taken by every single request, so batch fallbacks and escalations count against it too
+openai_semaphore = asyncio.Semaphore(OPENAI_CONCURRENCY)
+
+async def parse_completion(messages: List[dict], response_model: type, model: str = MODEL_STRONG):
+    """
+    Request a structured completion and validate it into response_model, giving up after
+    OPENAI_TIMEOUT seconds so one stuck request cannot hold a row and an OpenAI slot.
+    """
+    async with openai_semaphore:
+        response = await asyncio.wait_for(client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format=RESPONSE_FORMATS[response_model],
+        ), OPENAI_TIMEOUT)
+    message = response.choices[0].message
+    if message.content is None:
+        raise ValueError(f"No structured output returned: {message.refusal}")
+    return response_model.model_validate_json(message.content)
+
+async def extract_relevant_data(text: str, query: str, instructions: str,
+                                model: str = MODEL_FAST) -> Optional[ParagraphResponse]:
+    logger.info(f"Extracting relevant Data with OpenAI {model}")
+    cache_key = extraction_cache_key(text, query, instructions)
+    found, cached = await get_cached_extraction(cache_key)
+    if found:
+        logger.info("Using cached OpenAI extraction")
+        return cached
+    # Pages that never mention the query are consent walls, error pages or off-topic results
+    if not mentions_query(text, query):
+        logger.info("Text does not mention the query, skipping OpenAI")
+        return None
+
+    messages = [EXTRACTION_SYSTEM_MESSAGE, await build_user_message(query, instructions, text)]
+    result = None
+    if model != MODEL_STRONG:
+        try:
+            result = await parse_completion(messages, ParagraphResponse, model)
+        except Exception as e:
+            logger.error(f"Error calling OpenAI API with {model}: {e}")
+
+    # A failed, empty or low-scoring fast extraction is redone with the strong model
+    if result is None or needs_strong_model(result):
+        if model != MODEL_STRONG:
+            score = result.score if result is not None else None
+            logger.info(f"Retrying extraction with {MODEL_STRONG}, {model} scored {score}")
+        try:
+            result = await parse_completion(messages, ParagraphResponse, MODEL_STRONG)
+        except Exception as e:
+            logger.error(f"Error calling OpenAI API: {e}")
+            return FAILED_EXTRACTION
+
+    if result.content is None:
+        return await check_again_in_openai(text, query, instructions)
+    await cache_extraction(cache_key, result)
+    return result
+
+async def check_again_in_openai(text: str, query: str, instructions: str) -> ParagraphResponse:
+    logger.info("Checking again with OpenAI")
+    try:
+        result = await parse_completion(
+            [RECHECK_SYSTEM_MESSAGE, await build_user_message(query, instructions, text)], ParagraphResponse)
         if result.content is None:
-            return None
+            result = None
+        await cache_extraction(extraction_cache_key(text, query, instructions), result)
         return result
     except Exception as e:
         logger.error(f"Error calling OpenAI API: {e}")
-        # Return a proper ParagraphResponse object instead of a string
-        return ParagraphResponse(
-            content='--',
-            title='--',
-            subtitle='--',
-            score=0.0,
-            keywords=[],
-            category='--',
-            date='--',
-            source='--',
-            numeric_value=None,
-            unit='--',
-            type='--',
-            country='--',
-            location='--',
-            author='--',
-            references=[]
-        )
+        return FAILED_EXTRACTION
 
-# ---------------------- CSV Saving Function ----------------------
+EXTRACTION_BATCH_SIZE = 4  # Documents sent to OpenAI in a single request at the start of the run
+MIN_EXTRACTION_BATCH_SIZE = 2
+MAX_EXTRACTION_BATCH_SIZE = 8  # Keeps a batch of MAX_TEXT_TOKENS documents well inside the context window
+BATCH_MISSING_RATIO = 0.25  # A batch missing more of its documents than this counts as failed
 
-def save_to_csv(filename: str, data: List[List[str]]):
-    file_exists = os.path.isfile(filename)
-    existing_data = set()
-    header_exists = False
-
-    # Read existing data if file exists
-    if file_exists:
-        with open(filename, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            first_row = next(reader, None)
-            if first_row == ["Keywords", "Link", "Relevant Paragraph", 'Title', 'Relevancy Score', 'Keywords', 'Category', 'Date', 'Source', 'Numeric Value', 'Unit', 'Type', 'Country', 'Location', 'Author', 'References']:
-                header_exists = True
-            else:
-                file.seek(0)  # Reset file pointer to beginning
-            existing_data = set(tuple(row) for row in reader)
+class BatchSizer:
+    """
+    Adapts the number of documents per extraction request to what the model handles:
+    doubles after each batch that came back whole and halves after one that failed.
+    """
+    def __init__(self, size: int, minimum: int, maximum: int):
+        self.size = size
+        self.minimum = minimum
+        self.maximum = maximum
 
-    # Open file in append mode if it exists, otherwise in write mode
-    mode = 'a' if file_exists else 'w'
-    with open(filename, mode=mode, newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
+    def record(self, requested: int, returned: int):
+        if returned >= requested * (1 - BATCH_MISSING_RATIO):
+            self.size = min(self.maximum, self.size * 2)
+        else:
+            self.size = max(self.minimum, self.size // 2)
+            logger.info(f"Batch returned {returned} of {requested} documents, batch size lowered to {self.size}")
 
-        # Write header if file is new or doesn't have the header
-        if not file_exists or not header_exists:
-            writer.writerow(["Keywords", "Link", "Relevant Paragraph", 'Title', 'Relevancy Score', 'Keywords', 'Category', 'Date', 'Source', 'Numeric Value', 'Unit', 'Type', 'Country', 'Location', 'Author', 'References'])
+extraction_batch_size = BatchSizer(EXTRACTION_BATCH_SIZE, MIN_EXTRACTION_BATCH_SIZE, MAX_EXTRACTION_BATCH_SIZE)
 
-        # Write new, non-duplicate data
-        new_rows = 0
-        for row in data:
-            if tuple(row) not in existing_data:
-                writer.writerow(row)
-                new_rows += 1
+async def extract_relevant_data_batch(texts: List[str], query: str, instructions: str) -> List[Optional[ParagraphResponse]]:
+    """
+    Extract the relevant data from several documents with a single OpenAI request.
+    Returns one result per text, in the same order. Texts that never mention the query
+    get None without a request. The batch runs on MODEL_FAST, documents it could not handle
+    fall back to the single-document extraction, and weak results to MODEL_STRONG.
+    """
+    results = [None] * len(texts)
+    pending = []
+    cached_results = await get_cached_extractions(
+        [extraction_cache_key(text, query, instructions) for text in texts])
+    for i, (text, (found, cached)) in enumerate(zip(texts, cached_results)):
+        if found:
+            results[i] = cached
+        elif mentions_query(text, query):
+            pending.append(i)
+
+    if len(pending) <= 1:
+        for i in pending:
+            results[i] = await extract_relevant_data(texts[i], query, instructions)
+        return results
+
+    logger.info(f"Extracting relevant Data from {len(pending)} documents with OpenAI")
+    prepared = await asyncio.gather(*(prepare_text_async(texts[i], query) for i in pending))
+    documents = "\n\n".join(
+        f"Document {number}:\n{text}" for number, text in enumerate(prepared, start=1)
+    )
+    user_message = {"role": "user", "content": BATCH_USER_PROMPT_TEMPLATE.format(
+        query=query, instructions=instructions or NO_INSTRUCTIONS, documents=documents)}
 
-    print(f"Added {new_rows} new rows to {filename}")
-    logger.info(f"Added {new_rows} new rows to {filename}")
+    items = {}
+    try:
+        response = await parse_completion([BATCH_SYSTEM_MESSAGE, user_message], BatchParagraphResponse, MODEL_FAST)
+        items = {item.document: item for item in response.items}
+    except Exception as e:
+        logger.error(f"Error calling OpenAI API for batch: {e}")
+    extraction_batch_size.record(len(pending), sum(number in items for number in range(1, len(pending) + 1)))
+
+    # Documents the batch missed or answered weakly are redone one by one, concurrently,
+    # so a batch never waits on a chain of single-document requests
+    fallbacks = {}
+    for number, i in enumerate(pending, start=1):
+        item = items.get(number)
+        if item is None:
+            fallbacks[i] = extract_relevant_data(texts[i], query, instructions)
+        elif needs_strong_model(item):
+            fallbacks[i] = extract_relevant_data(texts[i], query, instructions, MODEL_STRONG)
+        else:
+            results[i] = ParagraphResponse(**item.model_dump(exclude={'document'}))
+            await cache_extraction(extraction_cache_key(texts[i], query, instructions), results[i])
+    for i, result in zip(fallbacks, await asyncio.gather(*fallbacks.values())):
+        results[i] = result
+    return results
+
+# ---------------------- CSV Saving Function ----------------------
+
+CSV_HEADER = ["Keywords", "Link", "Relevant Paragraph", 'Title', 'Relevancy Score', 'Keywords', 'Category', 'Date', 'Source', 'Numeric Value', 'Unit', 'Type', 'Country', 'Location', 'Author', 'References']
+
+RESULTS_CSV_FILE = "search_results.csv"
+CSV_BUFFER_SIZE = 1 << 20
+CSV_LINK_COLUMN = CSV_HEADER.index("Link")  # Rows are deduplicated on the link alone
+
+class CsvSink:
+    """
+    A CSV file held open for appending through one csv.writer, deduplicating rows on their link.
+    The links of the rows already in the file are loaded once, when it is opened.
+    """
+    def __init__(self, filename: str):
+        self.links = set()
+        is_empty = True
+
+        # Stream the existing rows once, keeping only their link
+        if os.path.isfile(filename):
+            with open(filename, mode='r', newline='', encoding='utf-8') as file:
+                for row in csv.reader(file):
+                    is_empty = False
+                    # The header is usually the first row, a file without one starts with data
+                    if row != CSV_HEADER and len(row) > CSV_LINK_COLUMN:
+                        self.links.add(row[CSV_LINK_COLUMN])
+
+        self.file = open(filename, mode='a', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE)
+        self.writer = csv.writer(self.file)
+
+        # Only a new or empty file gets a header, never the middle of existing rows
+        if is_empty:
+            self.writer.writerow(CSV_HEADER)
+
+    def write_many(self, rows: List[list]) -> int:
+        """
+        Append the rows whose link is not in the file yet. Returns the number written.
+        """
+        new_rows = []
+        for row in rows:
+            link = row[CSV_LINK_COLUMN]
+            if link not in self.links:
+                new_rows.append(row)
+                self.links.add(link)
+        self.writer.writerows(new_rows)
+        # Once per write call, the writer already batches rows from every worker
+        self.file.flush()
+        return len(new_rows)
+
+    def close(self):
+        self.file.close()
+
+def save_to_csv(csv_sink: CsvSink, data: List[List[str]]):
+    added = csv_sink.write_many(data)
+    print(f"Added {added} new rows to {csv_sink.file.name}")
+    logger.info(f"Added {added} new rows to {csv_sink.file.name}")
 
 # ---------------------- Google Sheets Update Function ----------------------
 
 async def update_in_sheets(service, data: List[List[str]]):
     logger.info("Updating Google Sheets")
     try:
-        values = [row for row in data]
-        body = {'values': values}
-        result = service.spreadsheets().values().append(
+        body = {'values': data}
+        result = await sheets_execute(service.spreadsheets().values().append(
             spreadsheetId=SPREADSHEET_ID,
             range=f"{RESULT_SHEET_NAME}!A:D",
             valueInputOption='RAW',
             insertDataOption='INSERT_ROWS',
-            body=body).execute()
+            body=body))
         updated_cells = result.get('updates', {}).get('updatedCells', 0)
         logger.info(f"Updated {updated_cells} cells in Google Sheets")
     except HttpError as e:
@@ -550,167 +1469,548 @@ async def update_in_sheets(service, data: List[List[str]]):
 
 # ---------------------- Google Sheets Counter Update Function ----------------------
 
-async def update_scraped_counter(service, row_index: int, new_count: int):
-    logger.info(f"Updating scraped counter for row {row_index} to {new_count}")
+SHEET_UPDATE_BATCH_SIZE = 50  # Cell writes buffered before they are sent in one batchUpdate
+# The counters are what stops a row from being scraped again after a crash,
+# so buffered writes are never held back longer than this many seconds
+SHEET_FLUSH_INTERVAL = 30
+pending_sheet_updates: List[dict] = []
+pending_counters: Dict[int, int] = {}  # Latest scraped counter of each row, by row index
+last_sheet_flush = 0.0  # Loop time of the last flush_sheet_updates
+
+def sheet_updates_due() -> bool:
+    if len(pending_sheet_updates) + len(pending_counters) >= SHEET_UPDATE_BATCH_SIZE:
+        return True
+    return asyncio.get_running_loop().time() - last_sheet_flush >= SHEET_FLUSH_INTERVAL
+
+async def queue_sheet_update(service, cell_range: str, values: List[list]):
+    """
+    Buffer a cell write, sending the buffer once it holds SHEET_UPDATE_BATCH_SIZE writes
+    or SHEET_FLUSH_INTERVAL seconds have passed since the last send.
+    """
+    pending_sheet_updates.append({"range": cell_range, "values": values})
+    if sheet_updates_due():
+        await flush_sheet_updates(service)
+
+async def update_scraped_counter(service, index: int, scraped_counter: int):
+    """
+    Buffer the scraped counter of a row. Only the latest value of each row is sent.
+    """
+    pending_counters[index] = scraped_counter
+    if sheet_updates_due():
+        await flush_sheet_updates(service)
+
+async def mark_row_done(service, index: int):
+    """
+    Queue marking a row of the input sheet as fully scraped by setting its column F to TRUE.
+    """
+    await queue_sheet_update(service, f"{SHEET_NAME}!F{index}", [["TRUE"]])
+    logger.info(f"Queued marking row {index} as fully scraped in Google Sheets")
+
+async def flush_sheet_updates(service):
+    """
+    Send all buffered cell writes and scraped counters with a single batchUpdate request.
+    """
+    global last_sheet_flush
+    last_sheet_flush = asyncio.get_running_loop().time()
+    if not pending_sheet_updates and not pending_counters:
+        return
+    data = pending_sheet_updates[:]
+    data.extend(
+        {"range": f"{SHEET_NAME}!G{row_index}", "values": [[new_count]]}  # Assuming Column G is the scraped counter
+        for row_index, new_count in pending_counters.items()
+    )
+    pending_sheet_updates.clear()
+    pending_counters.clear()
     try:
-        sheet = service.spreadsheets()
-        sheet.values().update(
+        await sheets_execute(service.spreadsheets().values().batchUpdate(
             spreadsheetId=SPREADSHEET_ID,
-            range=f"{SHEET_NAME}!G{row_index}",  # Assuming Column G is the scraped counter
-            valueInputOption="RAW",
-            body={"values": [[new_count]]}
-        ).execute()
-        logger.info(f"Updated scraped counter for row {row_index - 1} to {new_count}")
+            body={"valueInputOption": "RAW", "data": data}
+        ))
+        logger.info(f"Sent {len(data)} buffered cell updates to Google Sheets")
     except Exception as e:
-        logger.error(f"Error updating scraped counter for row {row_index - 1}: {e}")
+        logger.error(f"Error sending buffered cell updates {data}: {e}")
 
-# ---------------------- Main Scraper Function ----------------------
+async def flush_sheet_updates_periodically(service):
+    """
+    Send the buffered cell writes every SHEET_FLUSH_INTERVAL seconds, so they are not held
+    back while no new write arrives to trigger the send.
+    """
+    while True:
+        await asyncio.sleep(SHEET_FLUSH_INTERVAL)
+        await flush_sheet_updates(service)
 
-async def main():
-    logger.info("Starting web scraper")
+# ---------------------- Link Processing ----------------------
 
-    try:
-        service = get_google_sheets_service()
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=SPREADSHEET_ID, range=SHEET_NAME).execute()
-        rows = result.get('values', [])[1:]  # Skip header
+LINK_CONCURRENCY = 10  # Maximum number of links fetched at the same time
 
-        for index, row in enumerate(rows, start=2):  # Start at 2 to account for header
-            try:
-                # Unpack row data with default values if missing
-                keywords = row[0] if len(row) > 0 else ""
-                instructions = row[1] if len(row) > 1 else ""
-                start_date = row[2] if len(row) > 2 else ""
-                end_date = row[3] if len(row) > 3 else ""
-                paragraph_count = row[4]
-                scraped_flag =  row[5] if len(row) > 5 else "FALSE"
-                scraped_counter = int(row[6]) if len(row) > 6 else 0  
-
-                print(f"\n\nRow {index - 1}: {keywords}, {instructions}, {start_date}, {end_date}, {paragraph_count}, {scraped_flag}, {scraped_counter}\n\n")
-                if scraped_flag.upper() == "TRUE":
-                    logger.info(f"Row {index - 1} already fully scraped. Skipping.")
-                    continue
-                
-                if paragraph_count == "0" or not paragraph_count:
-                    logger.info("No Number of Paragraphs to Extract Provided. Skipping....")
-                    continue
+link_semaphore = asyncio.Semaphore(LINK_CONCURRENCY)
 
-                try:
-                    paragraph_count = int(paragraph_count)
-                except ValueError:
-                    logger.warning(f"Invalid paragraph count in row {index - 1}. Skipping.")
-                    continue
+# Bound every request so a single slow origin cannot stall the run
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=20, connect=5, sock_read=10)
+ZYTE_TIMEOUT = aiohttp.ClientTimeout(total=60)  # Zyte fetches the page before answering
 
-                keywords = keywords.replace('\'', '').strip()
-
-                # Calculate remaining paragraphs to scrape
-                remaining_paragraphs = paragraph_count - scraped_counter
-                if remaining_paragraphs <= 0:
-                    logger.info(f"Row {index - 1} has already scraped the required number of paragraphs.")
-                    # Optionally, mark as fully scraped
-                    sheet.values().update(
-                        spreadsheetId=SPREADSHEET_ID,
-                        range=f"{SHEET_NAME}!F{index}",
-                        valueInputOption="RAW",
-                        body={"values": [["TRUE"]]}
-                    ).execute()
-                    logger.info(f"Marked row {index - 1} as fully scraped in Google Sheets")
-                    continue
+# Normalized links some row is currently fetching or extracting
+links_in_flight = set()
+
+# Links without article text, or fetched but left unused once a row filled up, keep coming
+# back in later search rounds. Their outcome is remembered for the rest of the run.
+# Failed fetches are not remembered, the error may be gone by the next round.
+FETCH_CACHE_SIZE = 512
+fetch_cache: OrderedDict = OrderedDict()
+
+# The same article is often served under several URLs. Fingerprints of the page texts
+# already used for a query in this run, so only the first copy is sent to OpenAI.
+seen_contents = set()
 
-                # Fetch search results in batches of 10 pages
-                page = 1
-                while remaining_paragraphs > 0:
-                    links = await get_google_search_results(
-                    # links = await get_bing_search_results(
-                        keywords,
-                        start_date,
-                        end_date,
-                        num_results=10,  # Fetch enough to cover multiple batches
-                        scraped_urls=scraped_urls,
-                        max_pages=page
-                    )
-                    if not links:
+def content_fingerprint(content: str, query: str) -> bytes:
+    return hashlib.blake2b('\x00'.join([query, content]).encode('utf-8'), digest_size=16).digest()
+
+async def process_link(session: aiohttp.ClientSession, link: str,
+                       semaphore: asyncio.Semaphore) -> Optional[tuple]:
+    """
+    Fetch the content of a single link, reusing the outcome of an earlier fetch in this run.
+    Returns a (link, content) tuple, or None if the content could not be fetched.
+    """
+    key = normalize_url(link)
+    if key in fetch_cache:
+        fetch_cache.move_to_end(key)
+        logger.info(f"Using cached fetch result for {link}")
+        return fetch_cache[key]
+
+    async with semaphore:
+        content = await fetch_content_from_url(session, link)
+
+        # An empty string means the link has no article text, Zyte would not help
+        if content is None:
+            content = await fetch_content_with_zyte(session, link)
+        result = (link, content) if content else None
+
+    if content is not None:
+        fetch_cache[key] = result
+        if len(fetch_cache) > FETCH_CACHE_SIZE:
+            fetch_cache.popitem(last=False)
+
+    if result is None:
+        logger.error(f"Failed to fetch content from URL: {link}. Skipping.")
+    return result
+
+async def extract_batch(batch: list, query: str, instructions: str) -> List[Optional[ParagraphResponse]]:
+    """
+    Extract the relevant data from a batch of (link, content) tuples. Each OpenAI request
+    it makes takes its own openai_semaphore slot.
+    """
+    return await extract_relevant_data_batch([content for _, content in batch], query, instructions)
+
+async def dispatch_extractions(session: aiohttp.ClientSession, links: List[str], query: str,
+                               instructions: str, queue: asyncio.Queue):
+    """
+    Fetch links concurrently and start an OpenAI extraction as soon as extraction_batch_size.size
+    documents are ready, putting each (batch, extraction task) pair on the queue in that order.
+    Puts None once every link is handled. Cancelling it cancels the fetches still in flight.
+    Pages with the same text as one already used for the query, or fetched earlier in the
+    round, are skipped and recorded as scraped.
+    """
+    fetches = [asyncio.create_task(process_link(session, link, link_semaphore)) for link in links]
+    try:
+        batch = []
+        fingerprints = set()
+        for fetch in asyncio.as_completed(fetches):
+            try:
+                result = await fetch
+            except Exception as e:
+                logger.error(f"Error processing link: {e}")
+                continue
+            if result is None:
+                continue
+            fingerprint = content_fingerprint(result[1], query)
+            if fingerprint in seen_contents or fingerprint in fingerprints:
+                # A duplicate for this query, recorded so later search rounds do not return it again
+                logger.info(f"Skipping {result[0]}, same content as a page already extracted")
+                scraped_urls.add(result[0])
+                save_scraped_url(result[0])
+                continue
+            fingerprints.add(fingerprint)
+
+            batch.append(result)
+            if len(batch) >= extraction_batch_size.size:
+                queue.put_nowait((batch, asyncio.create_task(extract_batch(batch, query, instructions))))
+                batch = []
+
+        if batch:
+            queue.put_nowait((batch, asyncio.create_task(extract_batch(batch, query, instructions))))
+    finally:
+        for fetch in fetches:
+            fetch.cancel()
+        queue.put_nowait(None)
+
+# ---------------------- Row Processing ----------------------
+
+# Line breaks in an extracted paragraph would break up its cell, both are mapped to spaces in one pass
+NEWLINE_TABLE = str.maketrans({'\n': ' ', '\r': ' '})
+
+# The ParagraphResponse fields of a result row, in CSV column order, read in one call
+get_result_fields = operator.attrgetter(
+    'content', 'title', 'score', 'keywords', 'category', 'date', 'source', 'numeric_value',
+    'unit', 'type', 'country', 'location', 'author')
+
+def _int(value, default: int = 0) -> int:
+    """
+    Coerce a sheet cell to an int, tolerating whitespace. Empty or invalid cells give `default`.
+    """
+    try:
+        return int(str(value).strip())
+    except (ValueError, TypeError):
+        return default
+
+@dataclass(slots=True)
+class SheetRow:
+    """
+    One row of the input sheet, columns A to G.
+    """
+    keywords: str = ""
+    instructions: str = ""
+    start_date: str = ""
+    end_date: str = ""
+    paragraph_count: int = 0
+    scraped: bool = False
+    scraped_counter: int = 0
+
+    @classmethod
+    def from_sheet(cls, row: list) -> 'SheetRow':
+        # Missing trailing cells are padded with empty strings in a single pass
+        keywords, instructions, start_date, end_date, paragraph_count, scraped_flag, scraped_counter = \
+            itertools.islice(itertools.chain(row, itertools.repeat("")), 7)
+        return cls(
+            keywords=keywords.replace('\'', '').strip(),
+            instructions=instructions,
+            start_date=start_date,
+            end_date=end_date,
+            paragraph_count=_int(paragraph_count),
+            scraped=scraped_flag.upper() == "TRUE",
+            scraped_counter=_int(scraped_counter),
+        )
+
+async def process_row(session: aiohttp.ClientSession, service, results: asyncio.Queue,
+                      index: int, row: list, first_search: Optional[asyncio.Task] = None):
+    """
+    Scrape the paragraphs requested by a single row of the input sheet, putting the
+    result rows of each batch on the `results` queue of the writer.
+    `first_search` is the row's first search round if it was already started.
+    """
+    claimed = set()
+    try:
+        entry = SheetRow.from_sheet(row)
+        paragraph_count = entry.paragraph_count
+        scraped_counter = entry.scraped_counter
+
+        print(f"\n\nRow {index - 1}: {entry.keywords}, {entry.instructions}, {entry.start_date}, {entry.end_date}, {paragraph_count}, {entry.scraped}, {scraped_counter}\n\n")
+        if entry.scraped:
+            logger.info(f"Row {index - 1} already fully scraped. Skipping.")
+            return
+
+        if paragraph_count <= 0:
+            logger.info("No Number of Paragraphs to Extract Provided. Skipping....")
+            return
+
+        # Calculate remaining paragraphs to scrape
+        remaining_paragraphs = paragraph_count - scraped_counter
+        if remaining_paragraphs <= 0:
+            logger.info(f"Row {index - 1} has already scraped the required number of paragraphs.")
+            # Optionally, mark as fully scraped
+            await mark_row_done(service, index)
+            return
+
+        # Fetch search results in batches of 10 pages
+        page = 1
+        while remaining_paragraphs > 0:
+            if first_search is not None:
+                links, first_search = await first_search, None
+            else:
+                links = await get_google_search_results(
+                # links = await get_bing_search_results(
+                    session,
+                    entry.keywords,
+                    entry.start_date,
+                    entry.end_date,
+                    num_results=10,  # Fetch enough to cover multiple batches
+                    scraped_urls=scraped_urls,
+                    max_pages=page
+                )
+            if not links:
+                continue
+
+            # Other rows may have scraped or claimed some of the links while the search ran.
+            # Only about twice the missing paragraphs are fetched, the rest comes back in the
+            # next round. The links kept are claimed so concurrent rows do not fetch them too.
+            fresh_links = [link for link in dict.fromkeys(links)
+                           if link not in scraped_urls and normalize_url(link) not in links_in_flight]
+            if len(fresh_links) < len(links):
+                logger.info(f"Skipping {len(links) - len(fresh_links)} duplicate, scraped or in-progress URLs")
+            fresh_links = fresh_links[:max(remaining_paragraphs * 2, extraction_batch_size.size)]
+            claimed = {normalize_url(link) for link in fresh_links}
+            links_in_flight.update(claimed)
+
+            # Links are fetched concurrently and each batch is extracted as soon as it fills,
+            # so the row stops at the first batches that fill it and the rest is cancelled
+            queue = asyncio.Queue()
+            dispatcher = asyncio.create_task(
+                dispatch_extractions(session, fresh_links, entry.keywords, entry.instructions, queue))
+
+            processed_paragraphs = 0
+            while remaining_paragraphs > 0:
+                item = await queue.get()
+                if item is None:
+                    break
+
+                batch, extraction = item
+                extracted = await extraction
+
+                new_rows = []
+                for (link, content), relevant_data in zip(batch, extracted):
+                    if relevant_data is FAILED_EXTRACTION:
+                        # The request failed, the link was never really checked and stays retryable
+                        logger.info(f"Extraction failed for {link}, leaving it for a later round")
                         continue
-                    
-                    processed_paragraphs = 0
-                    for link in links:
-                        if link in scraped_urls:
-                            logger.info(f"URL already scraped: {link}. Skipping.")
-                            continue
-
-                        content = await fetch_content_from_url(link)
-                    
-                        if not content:
-                            content = await fetch_content_with_zyte(link)
-                            if not content:
-                                logger.error(f"Failed to fetch content from URL: {link}. Skipping.")
-                                continue
-                            
-                        relevant_data = extract_relevant_data(content, keywords, instructions) 
-
-                        if relevant_data is None:
-                            print('Not found any Data')
-                            # Add to scraped URLs and save immediately
-                            scraped_urls.add(link)
-                            save_scraped_urls(scraped_urls)
-                            continue
-                
-                        paragraph = relevant_data.content
-                        title = relevant_data.title
-                        score = relevant_data.score
-                        new_keywords = ', '.join(relevant_data.keywords) if relevant_data.keywords else "-"
-                        category = relevant_data.category
-                        date = relevant_data.date
-                        source = relevant_data.source
-                        numeric_value = relevant_data.numeric_value
-                        unit = relevant_data.unit
-                        type = relevant_data.type
-                        country = relevant_data.country
-                        location = relevant_data.location
-                        author = relevant_data.author
-
-                        data_row = [keywords, link, paragraph.replace('\n', ' '), title, score, new_keywords, category, date, source, numeric_value, unit, type, country, location, author]
-
-                        # Save to CSV
-                        save_to_csv("search_results.csv", [data_row])
-
-                        # Update Google Sheets
-                        await update_in_sheets(service, [data_row])
 
+                    seen_contents.add(content_fingerprint(content, entry.keywords))
+                    if relevant_data is None:
+                        print('Not found any Data')
                         # Add to scraped URLs and save immediately
                         scraped_urls.add(link)
-                        processed_paragraphs += 1
-                        remaining_paragraphs -= 1
-                        page += 1
-                        save_scraped_urls(scraped_urls)
-                        scraped_counter += 1
-                        await update_scraped_counter(service, index, scraped_counter)
-                    
-                        # If the required number of paragraphs has been scraped, mark the row as scraped
-                        if scraped_counter >= paragraph_count:
-                            sheet.values().update(
-                                spreadsheetId=SPREADSHEET_ID,
-                                range=f"{SHEET_NAME}!F{index}",
-                                valueInputOption="RAW",
-                                body={"values": [["TRUE"]]}
-                            ).execute()
-                            logger.info(f"Marked row {index} as fully scraped in Google Sheets")
-
-                        logger.info(
-                            f"Processed {processed_paragraphs} paragraphs for row {index}. Total scraped: {scraped_counter}/{paragraph_count}")
-        
-                        if remaining_paragraphs <= 0:
-                            break
-            except Exception as e:
-                logger.error(f"Error processing row {index}: {e}")
-                logger.error(traceback.format_exc())
+                        save_scraped_url(link)
+                        continue
+
+                    (paragraph, title, score, keywords, category, date, source, numeric_value,
+                     unit, type, country, location, author) = get_result_fields(relevant_data)
+                    new_keywords = ', '.join(keywords) if keywords else "-"
+
+                    data_row = [entry.keywords, link, paragraph.translate(NEWLINE_TABLE), title, score, new_keywords, category, date, source, numeric_value, unit, type, country, location, author]
+
+                    new_rows.append(data_row)
+
+                    # Add to scraped URLs and save immediately
+                    scraped_urls.add(link)
+                    processed_paragraphs += 1
+                    remaining_paragraphs -= 1
+                    page += 1
+                    save_scraped_url(link)
+                    scraped_counter += 1
+
+                    logger.info(
+                        f"Processed {processed_paragraphs} paragraphs for row {index}. Total scraped: {scraped_counter}/{paragraph_count}")
+
+                    if remaining_paragraphs <= 0:
+                        break
+
+                # One write of the newly scraped URLs per batch
+                flush_scraped_urls()
+
+                if not new_rows:
+                    continue
+
+                # The writer saves the rows while this row goes on with its next batch.
+                # The counter is buffered with the other cell writes and sent within
+                # SHEET_FLUSH_INTERVAL seconds, or as soon as the row completes.
+                await results.put(new_rows)
+                await update_scraped_counter(service, index, scraped_counter)
+
+                # If the required number of paragraphs has been scraped, mark the row as scraped
+                # and send its final counter and flag right away
+                if scraped_counter >= paragraph_count:
+                    await mark_row_done(service, index)
+                    await flush_sheet_updates(service)
+
+            # Fetches and batches past the one that filled the row are no longer needed
+            dispatcher.cancel()
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    item[1].cancel()
+            links_in_flight.difference_update(claimed)
+    except Exception as e:
+        logger.error(f"Error processing row {index}: {e}")
+        logger.error(traceback.format_exc())
+    finally:
+        links_in_flight.difference_update(claimed)
+        # The row was skipped before its prefetched search was needed
+        if first_search is not None:
+            first_search.cancel()
+
+ROW_CONCURRENCY = 10  # Number of workers, each processing one sheet row at a time
+ROW_PAGE_SIZE = 200  # Input rows read per batchGet request
+ROW_QUEUE_SIZE = 100  # Rows read ahead of the workers
+RESULT_QUEUE_SIZE = 100  # Batches of result rows waiting for the writer
+
+async def get_sheet_row_count(service) -> Optional[int]:
+    """
+    Number of rows in the input sheet's grid, blank ones included, or None if it cannot be read.
+    """
+    try:
+        result = await sheets_execute(service.spreadsheets().get(
+            spreadsheetId=SPREADSHEET_ID, ranges=[SHEET_NAME],
+            fields='sheets.properties.gridProperties.rowCount'))
+        return result['sheets'][0]['properties']['gridProperties']['rowCount']
+    except Exception as e:
+        logger.error(f"Error reading the row count of {SHEET_NAME}: {e}")
+        return None
+
+async def produce_rows(service, queue: asyncio.Queue, workers: int):
+    """
+    Page through the input sheet below the header, putting (index, row) pairs on the queue
+    as each page arrives. Puts one None per worker once the sheet is exhausted.
+    """
+    start = 2  # Row 1 is the header
+    try:
+        # The API trims empty trailing rows of every range, so a short page does not mean the
+        # sheet ended. Pages are read up to the grid's row count, or until one comes back empty.
+        row_count = await get_sheet_row_count(service)
+        while row_count is None or start <= row_count:
+            end = start + ROW_PAGE_SIZE - 1
+            result = await sheets_execute(service.spreadsheets().values().batchGet(
+                spreadsheetId=SPREADSHEET_ID, ranges=[f"{SHEET_NAME}!A{start}:G{end}"]))
+            rows = result['valueRanges'][0].get('values', [])
+            for offset, row in enumerate(rows):
+                if row:  # Blank rows inside the page come back as empty lists
+                    await queue.put((start + offset, row))
+
+            if row_count is None and not rows:
+                break
+            start = end + 1
+    except Exception as e:
+        logger.error(f"Error reading rows from Google Sheets: {e}")
+    finally:
+        for _ in range(workers):
+            await queue.put(None)
+
+def start_first_search(session: aiohttp.ClientSession, row: list) -> Optional[asyncio.Task]:
+    """
+    Start the first search round of a row ahead of time, unless the row will be skipped.
+    """
+    entry = SheetRow.from_sheet(row)
+    if entry.scraped or entry.paragraph_count <= entry.scraped_counter:
+        return None
+    return asyncio.create_task(get_google_search_results(
+        session, entry.keywords, entry.start_date, entry.end_date,
+        num_results=10, scraped_urls=scraped_urls, max_pages=1))
+
+async def write_results(service, csv_sink: CsvSink, results: asyncio.Queue):
+    """
+    Single writer for the result rows of every worker, until a None marks the end of the run.
+    Everything queued while the previous write ran goes into one CSV write and one sheet append.
+    The CSV write runs on a worker thread, alongside the append, so disk I/O never blocks the loop.
+    """
+    done = False
+    while not done:
+        rows = []
+        item = await results.get()
+        while True:
+            if item is None:
+                done = True
+            else:
+                rows.extend(item)
+            if results.empty():
+                break
+            item = results.get_nowait()
+
+        if not rows:
+            continue
+        csv_write, _ = await asyncio.gather(asyncio.to_thread(save_to_csv, csv_sink, rows),
+                                            update_in_sheets(service, rows), return_exceptions=True)
+        if isinstance(csv_write, Exception):
+            logger.error(f"Error saving {len(rows)} rows to CSV: {csv_write}")
+
+async def row_worker(session: aiohttp.ClientSession, service, results: asyncio.Queue,
+                     queue: asyncio.Queue):
+    """
+    Process rows from the queue one at a time until a None marks the end of the sheet.
+    While the queue holds more rows than there are workers, the worker also takes its next
+    row early and starts that row's first search, so it runs during the current row's
+    extraction instead of after it.
+    """
+    item, search = await queue.get(), None
+    while item is not None:
+        prefetched = False
+        next_item, next_search = None, None
+        if queue.qsize() > ROW_CONCURRENCY:
+            next_item, prefetched = queue.get_nowait(), True
+            if next_item is not None:
+                next_search = start_first_search(session, next_item[1])
+
+        index, row = item
+        await process_row(session, service, results, index, row, search)
+
+        if prefetched:
+            item, search = next_item, next_search
+        else:
+            item, search = await queue.get(), None
+
+# ---------------------- Main Scraper Function ----------------------
+
+async def main():
+    logger.info("Starting web scraper")
+    open_scraped_urls()
+
+    # One session for the whole run so connections are kept alive and reused
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=20, limit_per_host=4, ttl_dns_cache=300,
+                                       keepalive_timeout=30, enable_cleanup_closed=True),
+        timeout=HTTP_TIMEOUT,
+        headers={'User-Agent': USER_AGENT},
+    )
+
+    csv_sink = CsvSink(RESULTS_CSV_FILE)
+
+    service = None
+    writer = None
+    flusher = None
+    results = asyncio.Queue(maxsize=RESULT_QUEUE_SIZE)
+    try:
+        await asyncio.get_running_loop().run_in_executor(cache_executor, open_extraction_cache)
+        await asyncio.to_thread(get_text_encoding)
+        # Built on the Sheets worker thread, which also runs every request made with it
+        service = await asyncio.get_running_loop().run_in_executor(sheets_executor,
+                                                                   get_google_sheets_service)
+        # Rows are read page by page while the workers already process the first ones.
+        # Rows are independent, so ROW_CONCURRENCY of them are processed concurrently and
+        # the shared semaphores keep the number of fetches and OpenAI requests bounded.
+        # Their result rows go through a single writer, so saving overlaps extraction.
+        writer = asyncio.create_task(write_results(service, csv_sink, results))
+        flusher = asyncio.create_task(flush_sheet_updates_periodically(service))
+        queue = asyncio.Queue(maxsize=ROW_QUEUE_SIZE)
+        await asyncio.gather(
+            produce_rows(service, queue, ROW_CONCURRENCY),
+            *(row_worker(session, service, results, queue) for _ in range(ROW_CONCURRENCY)),
+        )
     except Exception as e:
         logger.critical(f"Critical error in main function: {str(e)}")
         logger.critical(traceback.format_exc())
+    finally:
+        if writer is not None:
+            await results.put(None)
+            await writer
+        if flusher is not None:
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+        if service is not None:
+            await flush_sheet_updates(service)
+        await session.close()
+        csv_sink.close()
+        if pdf_process_pool is not None:
+            pdf_process_pool.shutdown()
+        sheets_executor.shutdown()
+        cache_executor.submit(close_extraction_cache)
+        cache_executor.shutdown()
 
     logger.info("Web scraper finished")
 
 # ---------------------- Entry Point ----------------------
 
 if __name__ == "__main__":
+    setup_logging()
+    # uvloop is an optional, faster event loop (Linux/macOS only)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())